@@ -1,2 +1,3 @@
 from .filter import *
-from .pagination import *
\ No newline at end of file
+from .pagination import *
+from .fastdump import *
\ No newline at end of file
@@ -0,0 +1,212 @@
+from typing import Any, Callable, Optional
+from keyword import iskeyword
+from functools import lru_cache
+from marshmallow import fields as ma_fields, Schema
+from marshmallow.utils import ensure_text_type, missing
+
+__all__ = [
+    'PRIMITIVE_SCHEMAS',
+    'compile_dumper',
+    'get_dumper',
+    'primitive_schema',
+    'dump_primitive_rows',
+]
+
+# compiled dumpers by schema class, filled by compile_dumper
+_DUMPERS: dict[type[Schema], Callable[[list], list[dict]]] = {}
+
+# dumpers of a single object by schema class, used for the Nested fields of other schemas
+_ONE_DUMPERS: dict[type[Schema], Callable[[Any], dict]] = {}
+
+# schemas registered with primitive_schema, whose rows are returned as they are
+PRIMITIVE_SCHEMAS: set[type[Schema]] = set()
+
+# field types whose serialization is a plain conversion of the attribute value
+_CONVERTERS: dict[type[ma_fields.Field], str] = {
+    ma_fields.Raw: '{value}',
+    ma_fields.String: 'None if {value} is None else _ensure_text_type({value})',
+    ma_fields.Integer: 'None if {value} is None else int({value})',
+    ma_fields.Float: 'None if {value} is None else float({value})',
+}
+
+def _serialize_field(field: ma_fields.Field, attr: str, obj: Any):
+    """
+    This function serializes a field which has no compiled expression.
+
+    Args:
+        field (Field): The bound Marshmallow field to be serialized.
+        attr (str): The name of the field in its schema.
+        obj (Any): The object to be dumped.
+
+    Returns:
+        Any: The serialized value of the field.
+
+    Raises:
+        TypeError: If the field has no value, so the caller falls back to Schema.dump
+            which omits the key.
+    """
+    value = field.serialize(attr, obj)
+    if value is missing:
+        raise TypeError(f"Missing value for field: {attr}")
+    return value
+
+def _get_value_expression(field: ma_fields.Field, attr: str, field_ref: str, namespace: dict):
+    """
+    This function generates the source of the expression dumping a field of the object 'o'.
+
+    Args:
+        field (Field): The bound Marshmallow field to be dumped.
+        attr (str): The name of the field in its schema.
+        field_ref (str): The name under which the field is available in the namespace.
+        namespace (dict): The namespace of the generated function, to which the dumpers
+            of nested schemas are added.
+
+    Returns:
+        str: The source of the expression.
+    """
+    attribute = field.attribute or attr
+    # a missing attribute is dumped as the default, which only field.serialize reads
+    if not attribute.isidentifier() or iskeyword(attribute) or field.dump_default is not missing:
+        return f"_serialize_field({field_ref}, {attr!r}, o)"
+    value = f"o.{attribute}"
+    if type(field) in _CONVERTERS and not getattr(field, 'as_string', False):
+        return _CONVERTERS[type(field)].format(value=value)
+    nested = field.inner if isinstance(field, ma_fields.List) else field
+    if isinstance(nested, ma_fields.Nested) and isinstance(nested.nested, type) and issubclass(nested.nested, Schema) \
+            and nested.only is None and not nested.exclude:
+        try:
+            compile_dumper(nested.nested)
+        except TypeError:
+            return f"_serialize_field({field_ref}, {attr!r}, o)"
+        if nested.many or field is not nested:
+            dump_ref = f"_dump_many_{id(nested.nested)}"
+            namespace[dump_ref] = _DUMPERS[nested.nested]
+        else:
+            dump_ref = f"_dump_one_{id(nested.nested)}"
+            namespace[dump_ref] = _ONE_DUMPERS[nested.nested]
+        return f"None if {value} is None else {dump_ref}({value})"
+    return f"_serialize_field({field_ref}, {attr!r}, o)"
+
+def compile_dumper(SchemaClass: type[Schema]) -> Callable[[list], list[dict]]:
+    """
+    This function generates a function dumping a list of objects with the given schema,
+    and registers it so get_paginated_data uses it for the items of SchemaClass.
+
+    Instead of going through the field loop of Schema.dump for every object, the generated
+    function builds each dict with a single literal. String, Integer, Float and Raw fields
+    are converted inline, Nested and List(Nested) fields of schema classes use their own
+    compiled dumpers, and other fields, or fields with a dump_default, call field.serialize.
+
+    Args:
+        SchemaClass (Schema): The Marshmallow schema of the objects to be dumped.
+
+    Returns:
+        Callable[[list], list[dict]]: A function dumping a list of objects. It raises
+        TypeError or AttributeError for objects it can't dump, e.g. a missing attribute.
+
+    Raises:
+        TypeError: If the schema has pre_dump/post_dump hooks or a custom get_attribute,
+            which the generated function would skip.
+    """
+    if SchemaClass in _DUMPERS:
+        return _DUMPERS[SchemaClass]
+    if any(tag[0] in ('pre_dump', 'post_dump') for tag, hooks in SchemaClass._hooks.items() if hooks):
+        raise TypeError(f"Schema with dump hooks can't be compiled: {SchemaClass.__name__}")
+    if SchemaClass.get_attribute is not Schema.get_attribute:
+        raise TypeError(f"Schema with custom get_attribute can't be compiled: {SchemaClass.__name__}")
+
+    schema = SchemaClass()
+    namespace: dict[str, Any] = {'_serialize_field': _serialize_field, '_ensure_text_type': ensure_text_type}
+    items = []
+    for index, (attr, field) in enumerate(schema.dump_fields.items()):
+        field_ref = f"_field_{index}"
+        namespace[field_ref] = field
+        key = field.data_key if field.data_key is not None else attr
+        items.append(f"{key!r}: {_get_value_expression(field, attr, field_ref, namespace)}")
+    dict_source = "{" + ", ".join(items) + "}"
+    source = (
+        f"def _dump_one(o):\n"
+        f"    return {dict_source}\n"
+        f"def _dump(objs):\n"
+        f"    return [{dict_source} for o in objs]\n"
+    )
+    exec(compile(source, f"<fastdump {SchemaClass.__name__}>", "exec"), namespace)
+    _ONE_DUMPERS[SchemaClass] = namespace['_dump_one']
+    _DUMPERS[SchemaClass] = namespace['_dump']
+    return _DUMPERS[SchemaClass]
+
+def get_dumper(SchemaClass: type[Schema]) -> Optional[Callable[[list], list[dict]]]:
+    """
+    This function returns the dumper compiled for the given schema.
+
+    Args:
+        SchemaClass (Schema): The Marshmallow schema of the objects to be dumped.
+
+    Returns:
+        Optional[Callable[[list], list[dict]]]: The compiled dumper, or None if compile_dumper
+        was not called for SchemaClass.
+    """
+    return _DUMPERS.get(SchemaClass)
+
+def primitive_schema(SchemaClass: type[Schema]) -> type[Schema]:
+    """
+    This decorator registers a schema whose fields are all primitive values (int, str, datetime, UUID, ...) 
+    read as they are from the columns of a row.
+
+    When get_paginated_data paginates a column query (e.g. Model.query.with_entities(Model.id, Model.name)) 
+    with such a schema, the value of each dumped field is read from row._mapping instead of being dumped 
+    field by field, and encoding the values is left to the JSON provider of the app, e.g. one based on orjson. 
+    The selected columns must be labelled as the attributes of the fields, other columns are left out.
+
+    Args:
+        SchemaClass (Schema): The Marshmallow schema to be registered.
+
+    Returns:
+        Schema: The same schema class.
+    """
+    PRIMITIVE_SCHEMAS.add(SchemaClass)
+    return SchemaClass
+
+@lru_cache(maxsize=None)
+def _get_primitive_keys(SchemaClass: type[Schema]) -> tuple[tuple[str, str], ...]:
+    """
+    This function returns the (column label, output key) pairs of the dumped fields of a primitive schema.
+
+    Args:
+        SchemaClass (Schema): A Marshmallow schema registered with primitive_schema.
+
+    Returns:
+        tuple[tuple[str, str], ...]: The label of the column read for each field and the key it is dumped to.
+    """
+    return tuple(
+        (field.attribute or name, field.data_key if field.data_key is not None else name)
+        for name, field in SchemaClass().dump_fields.items()
+    )
+
+def dump_primitive_rows(SchemaClass: type[Schema], rows: list) -> list[dict]:
+    """
+    This function dumps rows of a column query with a schema registered with primitive_schema.
+
+    Only the dumped fields of the schema are read from each row, so it still acts as an allow-list 
+    of the returned columns.
+
+    Args:
+        SchemaClass (Schema): A Marshmallow schema registered with primitive_schema.
+        rows (list): The rows of a column query.
+
+    Returns:
+        list[dict]: A dictionary per row, mapping the keys of the schema to the column values.
+
+    Raises:
+        ValueError: If a field of the schema has no column with its label in the rows.
+        AttributeError: If the rows are ORM objects instead of rows.
+    """
+    keys = _get_primitive_keys(SchemaClass)
+    dumped_rows = []
+    for row in rows:
+        mapping = row._mapping
+        try:
+            dumped_rows.append({key: mapping[label] for label, key in keys})
+        except KeyError as error:
+            raise ValueError(f"Column {error} of schema {SchemaClass.__name__} is not selected by the query") from None
+    return dumped_rows
@@ -1,8 +1,52 @@
-from typing import TypedDict, Literal, Any, Callable, Union, cast
+from typing import TypedDict, Literal, Any, Callable, Optional, Union, cast
 from sqlalchemy.orm.attributes import InstrumentedAttribute
+from sqlalchemy.orm import raiseload
+from flask import current_app, has_app_context
 from sqlalchemy import or_
+import operator
 
-FilterType = Literal['eq', 'ne', 'lt', 'le', 'gt', 'ge', 'like', 'ilike', 'ends', 'starts', 'in', 'not_in', 'is_null', 'is_not_null']
+__all__ = [
+    'FilterType',
+    'get_filter_arg',
+    'FieldConfigValueTypeBase',
+    'FieldConfigValueType',
+    'FilterConfigDictType',
+    'FilterConfigListType',
+    'FilterConfigType',
+    'FilterBuilderType',
+    'CompiledFilterConfigType',
+    'compile_filter_config',
+    'get_filtered_query',
+]
+
+FilterType = Literal['eq', 'ne', 'lt', 'le', 'gt', 'ge', 'like', 'ilike', 'ends', 'starts', 'istarts', 'iends', 'in', 'not_in', 'contains', 'is_null', 'is_not_null']
+
+# escapes the LIKE wildcards of user values, so e.g. '%' matches a literal '%' instead of every row
+_LIKE_ESCAPE = str.maketrans({'\\': '\\\\', '%': '\\%', '_': '\\_'})
+
+def _escape_like(value: Any) -> str:
+    return str(value).translate(_LIKE_ESCAPE)
+
+# maps each filter type to a function building the filter argument from the field and the value
+_FILTERS: dict[str, Callable[[Any, Any], Any]] = {
+    'eq': operator.eq,
+    'ne': operator.ne,
+    'lt': operator.lt,
+    'le': operator.le,
+    'gt': operator.gt,
+    'ge': operator.ge,
+    'like': lambda field, value: field.like(f"%{_escape_like(value)}%", escape='\\'),
+    'ilike': lambda field, value: field.ilike(f"%{_escape_like(value)}%", escape='\\'),
+    'starts': lambda field, value: field.startswith(value),
+    'ends': lambda field, value: field.endswith(value),
+    'istarts': lambda field, value: field.ilike(f"{_escape_like(value)}%", escape='\\'),
+    'iends': lambda field, value: field.ilike(f"%{_escape_like(value)}", escape='\\'),
+    'in': lambda field, value: field.in_(value),
+    'not_in': lambda field, value: field.notin_(value),
+    'contains': lambda field, value: field.contains(value),
+    'is_null': lambda field, _: field.is_(None),
+    'is_not_null': lambda field, _: field.isnot(None),
+}
 
 def get_filter_arg(field: Any, value: Any, filter_type: FilterType):
     """
@@ -15,48 +59,21 @@ def get_filter_arg(field: Any, value: Any, filter_type: FilterType):
             This can be one of the following: 'eq', 'ne', 'lt', 'le', 'gt', 'ge', 'like', 'ilike', 
             'starts', 'ends', 'istarts', 'iends', 'in', 'not_in', 'contains', 'is_null', 'is_not_null'.
 
+    Wildcards in the value of 'like', 'ilike', 'istarts' and 'iends' filters are escaped, so they only 
+    match literally. An 'istarts' filter can use an index on PostgreSQL if there is one on lower(column) 
+    with text_pattern_ops, otherwise it scans the table.
+
     Returns:
         BinaryExpression: A SQLAlchemy BinaryExpression representing the filter.
 
     Raises:
         ValueError: If an invalid filter type is provided.
     """
-    if filter_type == 'eq':
-        return field == value
-    elif filter_type == 'ne':
-        return field != value
-    elif filter_type == 'lt':
-        return field < value
-    elif filter_type == 'le':
-        return field <= value
-    elif filter_type == 'gt':
-        return field > value
-    elif filter_type == 'ge':
-        return field >= value
-    elif filter_type == 'like':
-        return field.like(f'%{value}%')
-    elif filter_type == 'ilike':
-        return field.ilike(f'%{value}%')
-    elif filter_type == 'starts':
-        return field.startswith(value)
-    elif filter_type == 'ends':
-        return field.endswith(value)
-    elif filter_type == 'istarts':
-        return field.ilike(f"{value}%")
-    elif filter_type == 'iends':
-        return field.ilike(f"%{value}")
-    elif filter_type == 'in':
-        return field.in_(value)
-    elif filter_type == 'not_in':
-        return field.notin_(value)
-    elif filter_type == 'contains':
-        return field.contains(value)
-    elif filter_type == 'is_null':
-        return field.is_(None)
-    elif filter_type == 'is_not_null':
-        return field.isnot(None)
-    else:
-        raise ValueError(f"Invalid filter type: {filter_type}")
+    try:
+        build_filter = _FILTERS[filter_type]
+    except KeyError:
+        raise ValueError(f"Invalid filter type: {filter_type}") from None
+    return build_filter(field, value)
 
 class FieldConfigValueTypeBase(TypedDict):
     field: InstrumentedAttribute[Any]
@@ -70,41 +87,126 @@ FilterConfigDictType = FieldConfigValueType
 FilterConfigListType = list[FieldConfigValueType]
 FilterConfigType = dict[str, Union[FilterConfigDictType, FilterConfigListType]]
 
-def get_filtered_query(model, args, field_config: FilterConfigType = {}, join_models=[], ignore_deleted=False):
+# a compiled filter takes the request args and returns its filter argument, or None if the arg is not set
+FilterBuilderType = Callable[[dict], Any]
+CompiledFilterConfigType = list[FilterBuilderType]
+
+def _compile_filter(key: str, filter_config: FieldConfigValueType) -> FilterBuilderType:
+    """
+    This function compiles a single field configuration into a filter builder.
+
+    Args:
+        key (str): The key of the filter argument in the request args.
+        filter_config (FieldConfigValueType): A dictionary with 'field', 'look_up', and 'wrapper' keys.
+
+    Returns:
+        FilterBuilderType: A function returning the filter argument for the given args, or None if the arg is not set.
+
+    Raises:
+        ValueError: If an invalid filter type is provided.
+    """
+    field, filter_type, wrapper = filter_config['field'], filter_config.get('look_up', 'eq'), filter_config.get('wrapper')
+    if filter_type not in _FILTERS:
+        raise ValueError(f"Invalid filter type: {filter_type}")
+    build_filter = _FILTERS[filter_type]
+
+    # the config values are resolved once, so a call only reads the arg and builds the clause
+    def build(args):
+        data_value = args.get(key)
+        if not data_value:
+            return None
+        filter_arg = build_filter(field, data_value)
+        # wrapper is for the query expressions like Patient.query.filter(Patient.tags.any(Tag.id.in_(filter_tag_ids))).all()
+        # the wrapper will be Patient.tags.any, field will be Tag.id.in_ and data[key] will be filter_tag_ids
+        return wrapper(filter_arg) if wrapper else filter_arg
+
+    return build
+
+def _compile_or_filter(key: str, filter_configs: list[FieldConfigValueType]) -> FilterBuilderType:
+    """
+    This function compiles a list of field configurations into a filter builder combining them with or_.
+
+    Args:
+        key (str): The key of the filter argument in the request args.
+        filter_configs (list[FieldConfigValueType]): A non-empty list of dictionaries with 'field', 'look_up', and 'wrapper' keys.
+
+    Returns:
+        FilterBuilderType: A function returning the filter argument for the given args, or None if the arg is not set.
+
+    Raises:
+        ValueError: If an invalid filter type is provided.
+    """
+    or_filter_builders = [_compile_filter(key, filter_config) for filter_config in filter_configs]
+
+    def build(args):
+        if not args.get(key):
+            return None
+        return or_(*(build_filter(args) for build_filter in or_filter_builders))
+
+    return build
+
+def compile_filter_config(field_config: FilterConfigType) -> CompiledFilterConfigType:
+    """
+    This function compiles a field configuration into a list of filter builders.
+
+    The field configuration is static per endpoint, so it can be compiled once at import time 
+    and passed to get_filtered_query instead of being parsed again on every request.
+
+    Args:
+        field_config (FilterConfigType): The field configuration, as accepted by get_filtered_query.
+
+    Returns:
+        CompiledFilterConfigType: A list of functions, each returning a filter argument for the given args, 
+        or None if its arg is not set.
+
+    Raises:
+        ValueError: If an invalid filter type is provided.
+    """
+    filter_builders = []
+    for key, value in field_config.items():
+        if isinstance(value, dict):
+            filter_builders.append(_compile_filter(key, cast(FieldConfigValueType, value)))
+        # if the value is a list, then we will use the or_ function to combine the filter arguments
+        elif isinstance(value, list):
+            # or_() without arguments is SQL false, so an empty list must not produce a filter
+            if not value: continue
+            filter_builders.append(_compile_or_filter(key, value))
+    return filter_builders
+
+def get_filtered_query(model, args, field_config: Union[FilterConfigType, CompiledFilterConfigType] = {}, join_models=[], ignore_deleted=False, force_distinct=False, strict_loads: Optional[bool] = None):
     """
     This function generates a filtered SQLAlchemy query based on the provided model, arguments, and field configuration.
 
     Args:
         model (Model): The SQLAlchemy model to be queried.
         args (dict): A dictionary containing the filter arguments.
-        field_config (FilterConfigType): A dictionary or list containing the field configuration for the filter. 
-            If a dictionary is provided, it should map keys to another dictionary with 'field', 'look_up', and 'wrapper' keys. 
-            If a list is provided, it should contain dictionaries with 'field', 'look_up', and 'wrapper' keys.
+        field_config (Union[FilterConfigType, CompiledFilterConfigType]): A dictionary containing the field configuration for the filter, 
+            or the result of compile_filter_config for it. 
+            Each key maps to a dictionary with 'field', 'look_up', and 'wrapper' keys, 
+            or to a list of such dictionaries whose filters are combined with or_.
+        join_models (list): The models to be joined to the query. Rows are made distinct by id when any is given.
+        ignore_deleted (bool): If True, rows whose 'deleted' column is set are excluded.
+        force_distinct (bool): If True, rows are made distinct by id even without join_models, 
+            e.g. when a wrapper joins a one-to-many relationship.
+        strict_loads (Optional[bool]): If True, lazy loading any relationship of the returned rows raises 
+            instead of emitting a query, so N+1 queries show up during development and tests. 
+            If None, the SQLALCHEMY_HELPERS_STRICT_LOADS config of the current Flask app is used.
 
     Returns:
-        Query: A SQLAlchemy query filtered according to the provided arguments and field configuration.
+        Query: A SQLAlchemy query filtered according to the provided arguments and field configuration, 
+            ordered by id so its pages are stable. Use query.order_by(None).order_by(...) for another 
+            order, which must still start with id when rows are made distinct.
+            The query is a legacy Query rather than a lambda statement, since the pagination helpers 
+            need the Query API. Filter values are bound parameters, so the compiled SQL is still 
+            reused from SQLAlchemy's statement cache for the same set of filters.
     """
+    if not isinstance(field_config, list):
+        field_config = compile_filter_config(field_config)
     filter_arguments = []
-    for key, value in field_config.items():
-        if type(value) == dict:
-            value = cast(FieldConfigValueType, value)
-            field, filter_type, data_value, wrapper = value['field'], value.get('look_up', 'eq'), args.get(key), value.get('wrapper')
-            if not data_value: continue
-            filter_arg = get_filter_arg(field, args[key], filter_type)
-            # wrapper is for the query expressions like Patient.query.filter(Patient.tags.any(Tag.id.in_(filter_tag_ids))).all()
-            # the wrapper will be Patient.tags.any, field will be Tag.id.in_ and data[key] will be filter_tag_ids
-            filter_args = wrapper(filter_arg) if wrapper else filter_arg
-            filter_arguments.append(filter_args)
-        # if the value is a list, then we will use the or_ function to combine the filter arguments
-        elif type(value) == list:
-            or_filter_arguments = []
-            for filter_config in value:
-                field, filter_type, data_value, wrapper = filter_config['field'], filter_config.get('look_up', 'eq'), args.get(key), filter_config.get('wrapper')
-                if not data_value: continue
-                filter_arg = get_filter_arg(field, args[key], filter_type)
-                filter_arg = wrapper(filter_arg) if wrapper else filter_arg
-                or_filter_arguments.append(filter_arg)
-            filter_arguments.append(or_(*or_filter_arguments))
+    for build_filter in field_config:
+        filter_arg = build_filter(args)
+        if filter_arg is not None:
+            filter_arguments.append(filter_arg)
 
     query = model.query
     for join_model in join_models:
@@ -113,5 +215,13 @@ def get_filtered_query(model, args, field_config: FilterConfigType = {}, join_mo
     if ignore_deleted:
         filter_arguments.append(model.deleted == False)
     
-    return query.filter(*filter_arguments).distinct(model.id)
-
+    query = query.filter(*filter_arguments)
+    if strict_loads is None:
+        strict_loads = has_app_context() and current_app.config.get('SQLALCHEMY_HELPERS_STRICT_LOADS', False)
+    if strict_loads:
+        query = query.options(raiseload('*', sql_only=True))
+    # without joins every row of the model appears once, so DISTINCT ON would only add a sort
+    if force_distinct or join_models:
+        query = query.distinct(model.id)
+    # LIMIT/OFFSET pages of an unordered query may overlap or skip rows
+    return query.order_by(model.id)
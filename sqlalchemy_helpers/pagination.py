@@ -2,16 +2,37 @@ from typing import Generic, TypeVar, Optional
 from flask_restx import Model, fields
 from marshmallow import fields as ma_fields, Schema
 from math import ceil
+import hashlib
+from functools import lru_cache
 from flask_restx import reqparse
 from flask_restx import inputs
+from sqlalchemy import func, inspect
+from sqlalchemy.orm import Load, RelationshipProperty, selectinload
+from sqlalchemy.exc import CompileError
+from .fastdump import get_dumper, dump_primitive_rows, PRIMITIVE_SCHEMAS
 
-
+__all__ = [
+    'get_paginated_schema',
+    'infer_selectinload',
+    'get_paginated_response_model',
+    'PaginatedDataType',
+    'get_paginated_queryset',
+    'get_paginated_data',
+    'get_keyset_paginated_data',
+    'get_page_args',
+    'strip_page_args',
+    'get_paginated_parser',
+]
 
     
+@lru_cache(maxsize=128)
 def get_paginated_schema(SchemaClass):
     """
     This function generates a Marshmallow schema for paginated responses.
 
+    The schema is cached per SchemaClass. get_paginated_data builds its response without it, 
+    dumping only the items with SchemaClass, so it is kept for callers using the schema directly.
+
     Args:
         SchemaClass (Schema): The Marshmallow schema of the items to be paginated.
 
@@ -31,6 +52,80 @@ def get_paginated_schema(SchemaClass):
         
     return PaginatedSchema
 
+@lru_cache(maxsize=None)
+def _get_many_schema(SchemaClass):
+    """
+    This function returns a shared instance of SchemaClass dumping lists of items.
+
+    Marshmallow schemas hold no per-dump state, so one instance is reused for every call.
+
+    Args:
+        SchemaClass (Schema): The Marshmallow schema of the items to be paginated.
+
+    Returns:
+        Schema: An instance of SchemaClass with many=True.
+    """
+    return SchemaClass(many=True)
+
+
+# marks a query attribute which could not be read
+_UNKNOWN = object()
+
+# relationship loading strategies which load each row's relationship with its own query
+_LAZY_LOAD_STRATEGIES = ('select', 'raise', 'raise_on_sql')
+
+@lru_cache(maxsize=128)
+def infer_selectinload(SchemaClass, model):
+    """
+    This function generates selectinload options for the relationships dumped by a Marshmallow schema.
+
+    Every dumped Nested (or List of Nested) field of SchemaClass whose attribute is a lazy loaded 
+    relationship of model gets a selectinload, so the related rows of a page are fetched with one IN query per relationship 
+    instead of one lazy load per row.
+
+    Args:
+        SchemaClass (Schema): The Marshmallow schema of the items to be dumped.
+        model (Model): The SQLAlchemy model of the items.
+
+    Returns:
+        tuple: The selectinload options, one per matched relationship.
+    """
+    relationships = inspect(model).relationships
+    load_options = []
+    for name, field in SchemaClass().dump_fields.items():
+        nested = field.inner if isinstance(field, ma_fields.List) else field
+        if not isinstance(nested, ma_fields.Nested):
+            continue
+        attribute = field.attribute or name
+        # other strategies (dynamic, noload, joined, ...) are kept as the relationship configures them
+        if attribute in relationships and relationships[attribute].lazy in _LAZY_LOAD_STRATEGIES:
+            load_options.append(selectinload(getattr(model, attribute)))
+    return tuple(load_options)
+
+def _get_loaded_relationships(options):
+    """
+    This function returns the keys of the relationships whose loading is set by the given loader options.
+
+    Column options such as load_only(Model.name) or defer(Model.name) don't set any relationship.
+
+    Args:
+        options (Iterable): Loader options, e.g. the options of a query.
+
+    Returns:
+        Optional[set[str]]: The keys of the relationships, or None if an option could not be read.
+    """
+    keys = set()
+    for option in options:
+        if not isinstance(option, Load):
+            continue
+        try:
+            for element in option.context:
+                path = element.path.path
+                if len(path) > 1 and isinstance(path[1], RelationshipProperty):
+                    keys.add(path[1].key)
+        except (AttributeError, TypeError):
+            return None
+    return keys
 
 def get_paginated_response_model(response_model, model_name='PaginatedResponseModel'):
     """
@@ -72,22 +167,146 @@ def get_paginated_queryset(queryset, page: int, size: int):
     Args:
         queryset (QuerySet): The queryset to be paginated.
         page (int): The page number to be returned.
-        size (int): The number of items per page.
+        size (int): The number of items per page. If 0, the queryset is returned unpaginated.
 
     Returns:
         QuerySet: A paginated queryset.
     """
+    if size == 0:
+        return queryset
     queryset = queryset.limit(size).offset((page - 1) * size)
     return queryset
 
-def get_paginated_data(query, page_args, SchemaClass):
+def _get_plain_entity_mapper(query):
     """
-    This function paginates and serializes a given query.
+    This function returns the mapper of a query selecting a single mapped entity, without DISTINCT, 
+    GROUP BY, HAVING, LIMIT or OFFSET.
+
+    Query has no public accessors for these clauses, so they are read from its attributes. If one of them 
+    is not found, e.g. after a SQLAlchemy upgrade renamed it, the query is not considered plain and the 
+    callers use their generic path instead.
+
+    Args:
+        query (Query): The SQLAlchemy query to be checked.
+
+    Returns:
+        Optional[Mapper]: The mapper of the queried entity, or None if the query is not plain.
+    """
+    column_descriptions = query.column_descriptions
+    entity = column_descriptions[0]['entity']
+    if len(column_descriptions) != 1 or column_descriptions[0]['type'] is not entity:
+        return None
+    if getattr(query, '_distinct', True) or getattr(query, '_group_by_clauses', True) \
+            or getattr(query, '_having_criteria', True) \
+            or getattr(query, '_limit_clause', _UNKNOWN) is not None \
+            or getattr(query, '_offset_clause', _UNKNOWN) is not None:
+        return None
+    return inspect(entity)
+
+def _get_count_query(query):
+    """
+    This function builds a count query for the given query.
+
+    For a plain query of a single mapped entity (see _get_plain_entity_mapper), the count of the 
+    primary key is selected directly instead of wrapping the query in a subquery, so the planner 
+    can skip unused columns, and ORDER BY is dropped since the aggregate does not need it. 
+    Other queries, including distinct ones, are left to query.count(), which counts over a subquery 
+    and keeps the ORM criteria of the query, e.g. with_loader_criteria options.
+
+    Args:
+        query (Query): The SQLAlchemy query whose rows should be counted.
+
+    Returns:
+        Optional[Query]: A query returning the number of rows as a scalar, or None if the rows 
+        should be counted with query.count().
+    """
+    mapper = _get_plain_entity_mapper(query)
+    if mapper is None:
+        return None
+    entity = query.column_descriptions[0]['entity']
+    # read from the queried entity, so the criteria of single table inheritance subclasses are kept
+    pk_col = getattr(entity, mapper.get_property_by_column(mapper.primary_key[0]).key)
+    # the original query is kept, so loader criteria and other ORM options still apply
+    return query.with_entities(func.count(pk_col)).order_by(None)
+
+def _can_count_in_window(query):
+    """
+    This function checks if the total count of a query can be selected with count(*) OVER () 
+    along with its rows.
+
+    This is only done on PostgreSQL, since window function support on MySQL depends on the version, 
+    for plain queries of a single mapped entity (see _get_plain_entity_mapper). DISTINCT would be 
+    applied after the window, and column queries can't be split from the count without losing their keys.
 
     Args:
         query (Query): The SQLAlchemy query to be paginated.
-        page_args (dict): A dictionary containing 'page' and 'size' keys.
+
+    Returns:
+        bool: True if the count can be selected with the rows.
+    """
+    mapper = _get_plain_entity_mapper(query)
+    # the mapper selects the engine of the model's bind, e.g. with Flask-SQLAlchemy binds
+    return mapper is not None and query.session.get_bind(mapper=mapper).dialect.name == 'postgresql'
+
+def _cached_count(query, count, cache=None, ttl: int = 30):
+    """
+    This function runs a count, caching its result by the compiled SQL of the given query.
+
+    Args:
+        query (Query): The query identifying the count in the cache.
+        count (Callable[[], int]): A function running the count, e.g. count_query.scalar.
+        cache (Optional[Any]): A cache object with get(key) and set(key, value, ttl) methods, 
+            e.g. a Flask-Caching or Redis client. If None, the count is not cached.
+        ttl (int): The number of seconds to keep the count in the cache. Default is 30.
+
+    Returns:
+        int: The result of the count.
+    """
+    if cache is None:
+        return count()
+    try:
+        compiled = query.statement.compile(compile_kwargs={"literal_binds": True})
+    except (CompileError, NotImplementedError):
+        # some bound values can't be rendered inline, count without caching
+        return count()
+    key = 'sqlh:count:' + hashlib.blake2b(str(compiled).encode(), digest_size=16).hexdigest()
+    value = cache.get(key)
+    if value is None:
+        value = count()
+        cache.set(key, value, ttl)
+    return int(value)
+
+def get_paginated_data(query, page_args, SchemaClass, load_options=(), count_query=None, cache=None, cache_ttl: int = 30):
+    """
+    This function paginates and serializes a given query.
+
+    It uses LIMIT/OFFSET and counts the whole filtered set on every call, both of which 
+    scale with the size of the table. Prefer get_keyset_paginated_data for large tables.
+
+    Args:
+        query (Query): The SQLAlchemy query to be paginated. It should have an ORDER BY on unique columns, 
+            e.g. the primary key, otherwise the database may return overlapping pages or skip rows. 
+            Queries of get_filtered_query are ordered by id.
+        page_args (dict): A dictionary containing 'page' and 'size' keys, as returned by get_page_args. 
+            If 'size' is 0 all rows are returned as page 1, and if 'pagination' is False the page is 
+            returned without counting, one extra row being fetched to know if there is a next page. 
+            In both cases no count query is run, total_count is the number of returned items and 
+            total_page is the last page known to exist, so it is never less than current_page.
         SchemaClass (Schema): The Marshmallow schema of the items to be paginated.
+        load_options (Iterable): Loader options applied to the page query only, e.g. 
+            selectinload(Model.tags). If empty, they are inferred from the Nested fields of SchemaClass 
+            with infer_selectinload, otherwise every row would trigger its own lazy load during serialization. 
+            Relationships whose loading is already set by the options of the query are left out.
+            If a dumper was compiled for SchemaClass with compile_dumper, it is used for the items. 
+            If SchemaClass is decorated with primitive_schema and the query selects columns, 
+            the dumped fields are read from the rows without going through the schema.
+        count_query (Optional[Query]): A query returning the total count as a scalar. 
+            If None, a count(pk) query is built from the given query when it is a plain entity query, 
+            otherwise query.count() is used. On PostgreSQL, without count_query and cache, 
+            the total is selected with the page rows using count(*) OVER ().
+        cache (Optional[Any]): A cache object with get(key) and set(key, value, ttl) methods 
+            used to cache the total count. If None, the count is run on every call.
+        cache_ttl (int): The number of seconds to keep the total count in the cache. Default is 30.
 
     Returns:
         dict: A dictionary containing paginated and serialized data. 
@@ -96,36 +315,151 @@ def get_paginated_data(query, page_args, SchemaClass):
         indicating if there are next or previous pages.
     """
     page = page_args.get('page') or 1
-    size = page_args.get('size') or 10
-    paginated_queryset = get_paginated_queryset(query, page, size)
-    paginated_schema = get_paginated_schema(SchemaClass)()
-    total_count = query.count()
-    total_page = ceil(total_count / size)
-    has_next = page < total_page
-    has_prev = page > 1
-    serialized_data = paginated_schema.dump({
-        'items': paginated_queryset.all(),
+    size = page_args.get('size')
+    if size is None:
+        size = 10
+    column_description = query.column_descriptions[0]
+    if not load_options and column_description['type'] is column_description['entity']:
+        loaded_relationships = _get_loaded_relationships(query._with_options)
+        # the options of the query would conflict with inferred ones for the same relationships
+        if loaded_relationships is not None:
+            load_options = tuple(
+                option for option in infer_selectinload(SchemaClass, column_description['entity'])
+                if not _get_loaded_relationships((option,)) & loaded_relationships
+            )
+    total_count = None
+    if size == 0:
+        page = 1
+        items = query.options(*load_options).all()
+        total_count = len(items)
+        total_page = 1
+        has_next = False
+        has_prev = False
+    elif page_args.get('pagination') is False:
+        items = query.limit(size + 1).offset((page - 1) * size).options(*load_options).all()
+        has_next = len(items) > size
+        items = items[:size]
+        total_count = len(items)
+        total_page = page + 1 if has_next else page
+        has_prev = page > 1
+    else:
+        if count_query is None and cache is None and _can_count_in_window(query):
+            # the total is selected along with the page rows, saving the round-trip of the count query
+            windowed_query = query.add_columns(func.count().over().label('total_count'))
+            rows = get_paginated_queryset(windowed_query, page, size).options(*load_options).all()
+            items = [row[0] for row in rows]
+            if rows:
+                total_count = rows[0][1]
+        else:
+            items = get_paginated_queryset(query, page, size).options(*load_options).all()
+        # an empty page past the end has no row to carry the window count
+        if total_count is None:
+            if count_query is None:
+                count_query = _get_count_query(query)
+            if count_query is None:
+                total_count = _cached_count(query, query.count, cache, cache_ttl)
+            else:
+                total_count = _cached_count(count_query, count_query.scalar, cache, cache_ttl)
+        total_page = ceil(total_count / size)
+        has_next = page < total_page
+        has_prev = page > 1
+    dumped_items = None
+    if SchemaClass in PRIMITIVE_SCHEMAS:
+        try:
+            dumped_items = dump_primitive_rows(SchemaClass, items)
+        except AttributeError:
+            # ORM objects instead of rows, dump them with the schema
+            pass
+    dumper = get_dumper(SchemaClass)
+    if dumped_items is None and dumper is not None:
+        try:
+            dumped_items = dumper(items)
+        except (TypeError, AttributeError):
+            # the compiled dumper can't handle these objects, dump them with marshmallow
+            pass
+    if dumped_items is None:
+        dumped_items = _get_many_schema(SchemaClass).dump(items)
+    # the envelope values already have their serialized types, only the items go through marshmallow
+    return {
+        'items': dumped_items,
         'total_count': total_count,
         'total_page': total_page,
         'current_page': page,
         'has_next': has_next,
         'has_prev': has_prev
-    })
-    return serialized_data
+    }
+
+def get_keyset_paginated_data(query, cursor, size: int, key_column=None):
+    """
+    This function paginates a given query by key instead of by offset.
+
+    Rows are ordered by key_column and only rows after the cursor are fetched, so neither 
+    OFFSET nor COUNT is needed. One extra row is fetched to know if there is a next page.
+
+    The ordering of the query is replaced by key_column. A query with DISTINCT ON, e.g. from 
+    get_filtered_query with join_models, must be paginated by the DISTINCT ON column (the id), 
+    since PostgreSQL requires the ORDER BY to start with the DISTINCT ON expressions.
+
+    Args:
+        query (Query): The SQLAlchemy query to be paginated.
+        cursor (Any): The key of the last item of the previous page. None for the first page.
+        size (int): The number of items per page. Must be at least 1.
+        key_column (Optional[InstrumentedAttribute]): A unique, sortable column to paginate by. 
+            Defaults to the id column of the queried model.
+
+    Returns:
+        dict: A dictionary containing the items of the page, the cursor of the next page 
+        (None if there is no next page) and a boolean indicating if there is a next page.
+
+    Raises:
+        ValueError: If size is less than 1.
+    """
+    if size < 1:
+        raise ValueError(f"Invalid page size: {size}")
+    if key_column is None:
+        key_column = query.column_descriptions[0]['entity'].id
+    keyset_query = query.order_by(None).order_by(key_column.asc())
+    if cursor is not None:
+        keyset_query = keyset_query.filter(key_column > cursor)
+    rows = keyset_query.limit(size + 1).all()
+    has_next = len(rows) > size
+    rows = rows[:size]
+    next_cursor = getattr(rows[-1], key_column.key) if has_next else None
+    return {'items': rows, 'next_cursor': next_cursor, 'has_next': has_next}
 
 def get_page_args(args: dict): 
     """
     This function extracts pagination arguments from a dictionary.
 
+    The dictionary is not modified, use strip_page_args to remove the pagination arguments from it.
+
     Args:
-        args (dict): A dictionary from which to extract 'page' and 'size' keys.
+        args (dict): A dictionary from which to extract 'page', 'size' and 'pagination' keys. 
+            A missing size defaults to 10, while a size of 0 is kept to request all rows.
 
     Returns:
-        dict: A dictionary containing 'page' and 'size' keys.
+        dict: A dictionary containing 'page' and 'size' keys, and the 'pagination' key if it was given.
+    """
+    page = args.get('page') or 1
+    size = args.get('size')
+    if size is None:
+        size = 10
+    page_args = {'page': page, 'size': size}
+    if 'pagination' in args:
+        page_args['pagination'] = args['pagination']
+    return page_args
+
+def strip_page_args(args: dict):
+    """
+    This function removes pagination arguments from a dictionary, e.g. before passing it 
+    as filter arguments to get_filtered_query.
+
+    Args:
+        args (dict): A dictionary from which to remove 'page', 'size' and 'pagination' keys.
     """
-    page = args.pop('page') or 1
-    size = args.pop('size') or 10
-    return {'page': page, 'size': size}
+    args.pop('page', None)
+    args.pop('size', None)
+    args.pop('pagination', None)
 
 def get_paginated_parser(parser: Optional[reqparse.RequestParser] = None, min_size: int = 3, max_size: int = 100):
     """
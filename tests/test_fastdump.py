@@ -0,0 +1,26 @@
+import unittest
+from types import SimpleNamespace
+
+from marshmallow import Schema, fields
+
+from sqlalchemy_helpers import compile_dumper
+
+
+class DefaultSchema(Schema):
+    id = fields.Integer()
+    name = fields.String()
+    status = fields.String(dump_default='active')
+
+
+class CompileDumperTest(unittest.TestCase):
+    def test_string_decodes_bytes_as_schema_dump(self):
+        rows = [SimpleNamespace(id=1, name='é'.encode(), status='x')]
+        self.assertEqual(compile_dumper(DefaultSchema)(rows), DefaultSchema(many=True).dump(rows))
+
+    def test_missing_attribute_dumps_default(self):
+        rows = [SimpleNamespace(id=1, name='a')]
+        self.assertEqual(compile_dumper(DefaultSchema)(rows), [{'id': 1, 'name': 'a', 'status': 'active'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
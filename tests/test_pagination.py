@@ -0,0 +1,96 @@
+import unittest
+
+from marshmallow import Schema, fields
+from sqlalchemy import Column, ForeignKey, Integer, String, create_engine, event
+from sqlalchemy.orm import declarative_base, load_only, relationship, scoped_session, sessionmaker, with_loader_criteria
+
+from sqlalchemy_helpers import get_filtered_query, get_paginated_data
+
+engine = create_engine('sqlite://')
+session = scoped_session(sessionmaker(bind=engine))
+Base = declarative_base()
+Base.query = session.query_property()
+
+
+class Dept(Base):
+    __tablename__ = 'dept'
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+
+
+class Emp(Base):
+    __tablename__ = 'emp'
+    id = Column(Integer, primary_key=True)
+    kind = Column(String)
+    name = Column(String)
+    dept_id = Column(ForeignKey('dept.id'))
+    dept = relationship(Dept)
+    __mapper_args__ = {'polymorphic_on': kind, 'polymorphic_identity': 'emp'}
+
+
+class Mgr(Emp):
+    __mapper_args__ = {'polymorphic_identity': 'mgr'}
+
+
+class EmpSchema(Schema):
+    id = fields.Integer()
+    name = fields.String()
+
+
+class DeptSchema(Schema):
+    id = fields.Integer()
+    name = fields.String()
+
+
+class EmpWithDeptSchema(Schema):
+    id = fields.Integer()
+    name = fields.String()
+    dept = fields.Nested(DeptSchema)
+
+
+class PaginatedDataTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        Base.metadata.create_all(engine)
+        dept = Dept(name='d')
+        session.add_all([Emp(name=f'e{i}', dept=dept) for i in range(5)])
+        session.add_all([Mgr(name=f'm{i}', dept=dept) for i in range(2)])
+        session.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        session.remove()
+        Base.metadata.drop_all(engine)
+
+    def test_total_count_of_inherited_mapper(self):
+        data = get_paginated_data(Mgr.query, {'page': 1, 'size': 10}, EmpSchema)
+        self.assertEqual(data['total_count'], Mgr.query.count())
+        self.assertEqual(len(data['items']), 2)
+
+    def test_total_count_of_inherited_mapper_with_joins(self):
+        query = get_filtered_query(Mgr, {}, join_models=[Mgr.dept])
+        data = get_paginated_data(query, {'page': 1, 'size': 10}, EmpSchema)
+        self.assertEqual(data['total_count'], 2)
+
+    def test_total_count_of_distinct_query_with_loader_criteria(self):
+        query = Emp.query.options(with_loader_criteria(Emp, Emp.id > 3)).distinct()
+        data = get_paginated_data(query, {'page': 1, 'size': 10}, EmpSchema)
+        self.assertEqual(data['total_count'], query.count())
+
+    def test_column_options_keep_inferred_selectinload(self):
+        session.expunge_all()
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            query = Emp.query.options(load_only(Emp.name))
+            data = get_paginated_data(query, {'page': 1, 'size': 10}, EmpWithDeptSchema)
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+        self.assertEqual(data['items'][0]['dept']['name'], 'd')
+        # the count, the page and one IN query for the departments
+        self.assertEqual(len(statements), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()